@@ -4,9 +4,11 @@ Book Sort 主程序 - 重构版本
 """
 import argparse
 import asyncio
+import logging
+import os
 import sys
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set
 
 # 添加当前目录到 Python 路径，以便导入模块
 sys.path.insert(0, '.')
@@ -17,6 +19,7 @@ from database.models import BookInfo
 from scanners.file_scanner import FileScanner
 from services.ai_categorization_service import AICategorizationService
 from services.file_manager import FileManager
+from services.llm_cache import LLMCache
 from utils.task_manager import TaskManager
 
 
@@ -49,6 +52,8 @@ class BookSortController:
         self.ai_service = ai_service
         self.file_manager = file_manager
         self.task_manager = task_manager
+        # 分类过程中的进度输出队列，由后台协程统一写出
+        self._log_queue: Optional[asyncio.Queue] = None
 
     def run(self, src_dir: str, target_dir: str) -> None:
         """运行图书分类系统
@@ -65,6 +70,9 @@ class BookSortController:
             print("🚀 Book Sort 智能图书分类系统")
             print("=" * 60)
 
+            # 在创建任务之前校验并发配置，避免任务创建后才因配置错误失败
+            self.config_manager.get_ai_concurrency()
+
             # 1. 检查目录访问权限
             print("1️⃣ 检查目录权限...")
             self.file_scanner.check_directory_access(src_dir)
@@ -100,6 +108,11 @@ class BookSortController:
             session = self.database_manager.get_session()
 
             try:
+                # 一次性登记所有图书的元信息（已有记录保持不变）
+                file_stats = self.file_scanner.stat_books(book_files)
+                inserted = self.database_manager.bulk_create_book_info(session, file_stats)
+                print(f"✓ 登记新图书记录 {inserted} 条")
+
                 task = self.task_manager.create_task(session, task_id, book_files)
                 print(f"✓ 创建分类任务 {task_id}")
                 print(f"  总文件数: {task.total_files}")
@@ -109,15 +122,10 @@ class BookSortController:
                 print("\n6️⃣ 开始异步分类...")
                 asyncio.run(self._process_classification(session, task, target_dir))
 
-                # Get final task status for summary
-                final_session = self.database_manager.get_session()
-                try:
-                    final_task = self.task_manager.get_task(final_session, task.task_id)
-                    if final_task:
-                        print(f"\n✅ 分类任务完成")
-                        print(f"   处理文件总数: {final_task.processed_files}/{final_task.total_files}")
-                finally:
-                    final_session.close()
+                # 复用同一会话读取最终任务状态
+                session.refresh(task)
+                print(f"\n✅ 分类任务完成")
+                print(f"   处理文件总数: {task.processed_files}/{task.total_files}")
 
             except Exception as e:
                 print(f"❌ 分类任务执行失败: {e}")
@@ -135,6 +143,9 @@ class BookSortController:
                                      target_dir: str) -> None:
         """处理分类任务（异步）
 
+        待处理文件预先切分为批次，多个批次并发请求 AI 服务（受信号量限制），
+        数据库写入统一交给单个写入协程，保持 SQLite 单写者语义
+
         Args:
             session: 数据库会话
             task: 分类任务对象
@@ -142,94 +153,230 @@ class BookSortController:
         """
         batch_size = self.config_manager.get_batch_max_size()
         uncat_folder = self.config_manager.get_uncat_folder()
+        concurrency = self.config_manager.get_ai_concurrency()
 
-        # 持续处理直到任务完成
-        while not self.task_manager.is_task_completed(task):
-            # 获取当前任务状态
-            progress_info = self.task_manager.get_task_progress(session, task.task_id)
-            if not progress_info:
-                break
+        pending_files = self.task_manager.get_pending_files(session, task.task_id)
+        if not pending_files:
+            return
 
-            # Get the actual pending files list from the task object
-            current_session = self.database_manager.get_session()
-            try:
-                task_obj = self.task_manager.get_task(current_session, task.task_id)
-                if not task_obj or not task_obj.pending_files:
-                    break
+        batches = [pending_files[i:i + batch_size]
+                   for i in range(0, len(pending_files), batch_size)]
+        print(f"   共 {len(batches)} 个批次，最大并发数: {concurrency}")
+
+        # 现有分类在整个任务中只扫描一次，新建分类目录时直接追加
+        existing_categories = self.file_scanner.get_existing_categories(target_dir, uncat_folder)
+        # 各分类目录的文件名列表同样只读取一次，用于内存中的文件名冲突检测
+        dir_listing_cache = {}
 
-                import json
-                pending_files_list = json.loads(task_obj.pending_files)
+        self._log_queue = asyncio.Queue()
+        console_writer = asyncio.create_task(self._write_console_output(self._log_queue))
 
-                if not pending_files_list:
-                    break
+        result_queue = asyncio.Queue()
+        writer = asyncio.create_task(self._write_batch_results(session, task, result_queue))
+        semaphore = asyncio.Semaphore(concurrency)
 
-                batch_files = pending_files_list[:batch_size]
-                batch_filenames = [self._get_filename_from_path(f) for f in batch_files]
+        async def _bounded(batch_files: List[str]) -> None:
+            async with semaphore:
+                await self._process_batch(batch_files, target_dir, uncat_folder,
+                                          existing_categories, dir_listing_cache, result_queue)
 
-                print(f"\n📦 正在处理批次，包含 {len(batch_files)} 个文件...")
-                print(f"   进度: {progress_info['processed_files']}/{progress_info['total_files']} "
-                      f"({progress_info['percentage']:.1f}%)")
+        try:
+            # 所有批次共享 AI 服务的 HTTP 会话，结束时在同一事件循环中关闭
+            async with self.ai_service:
+                batch_tasks = [asyncio.create_task(_bounded(batch)) for batch in batches]
+
+                def _cancel_batches() -> None:
+                    for batch_task in batch_tasks:
+                        batch_task.cancel()
 
-                # 调用 AI 服务进行分类
-                existing_categories = self.file_scanner.get_existing_categories(target_dir, uncat_folder)
-                classification_results = await self.ai_service.classify_books(
-                    batch_filenames, existing_categories
-                )
+                # 写入协程失败后继续移动的文件将无法记录，立即取消剩余批次
+                writer.add_done_callback(lambda _: _cancel_batches())
+                try:
+                    await asyncio.gather(*batch_tasks)
+                except BaseException:
+                    # 任一批次失败（或写入失败导致取消）时取消其余批次，并等待它们全部结束，
+                    # 确保关闭共享会话和发送结束标记之前，已产生的结果都已进入队列
+                    _cancel_batches()
+                    await asyncio.gather(*batch_tasks, return_exceptions=True)
+                    raise
+        finally:
+            # 通知写入协程结束，并等待已提交的结果全部落库
+            try:
+                await result_queue.put(None)
+                await writer
+            finally:
+                # 输出剩余的进度信息后停止后台输出协程
+                self._log_queue.put_nowait(None)
+                await console_writer
+                self._log_queue = None
+
+    async def _process_batch(self,
+                             batch_files: List[str],
+                             target_dir: str,
+                             uncat_folder: str,
+                             existing_categories: List[str],
+                             dir_listing_cache: Dict[str, Set[str]],
+                             result_queue: asyncio.Queue) -> None:
+        """分类并移动一个批次的文件，结果交给写入协程落库
+
+        Args:
+            batch_files: 本批次文件路径列表
+            target_dir: 目标目录
+            uncat_folder: 未分类文件夹名称
+            existing_categories: 本次任务共享的现有分类列表，新建分类时原地追加
+            dir_listing_cache: 本次任务共享的分类目录文件名缓存
+            result_queue: 批次结果队列
+        """
+        batch_filenames = [self._get_filename_from_path(f) for f in batch_files]
 
-                if not classification_results:
-                    print("⚠️  API未返回有效的分类结果，将使用默认分类")
+        self._log(f"\n📦 正在处理批次，包含 {len(batch_files)} 个文件...")
 
-                # 处理分类结果
-                completed_files_list = []
-                for file_path in batch_files:
+        try:
+            # 调用 AI 服务进行分类
+            classification_results = await self.ai_service.classify_books(
+                batch_filenames, existing_categories
+            )
+
+            if not classification_results:
+                self._log("⚠️  API未返回有效的分类结果，将使用默认分类")
+
+            # 处理分类结果
+            book_categories = {}
+            book_paths = {}
+            completed_files = {}
+            try:
+                for file_path, filename in zip(batch_files, batch_filenames):
                     try:
-                        filename = self._get_filename_from_path(file_path)
                         category = classification_results.get(filename, uncat_folder)
 
-                        # 移动文件
-                        target_path = self.file_manager.move_file_to_category(
-                            file_path, target_dir, category
+                        # 在线程池中移动文件，慢速磁盘或网络存储不会阻塞其他批次的 API 请求
+                        target_path, created_new_category = await self.file_manager.move_file_to_category_async(
+                            file_path, target_dir, category, dir_listing_cache
                         )
+                        if created_new_category and category != uncat_folder:
+                            existing_categories.append(category)
 
-                        # 更新数据库
-                        book_info = self.database_manager.get_or_create_book_info(
-                            current_session, filename, target_path
-                        )
-                        self.database_manager.update_book_category(current_session, filename, category)
+                        book_categories[filename] = category
+                        book_paths[filename] = target_path
 
                         # 记录完成状态
-                        completed_files_list.append(file_path)
+                        completed_files[file_path] = category
 
                     except Exception as e:
-                        print(f"✗ 处理文件失败: {e}")
+                        self._log(f"✗ 处理文件失败: {e}")
                         # 即使出错，也将其标记为完成，避免无限循环
-                        completed_files_list.append(file_path)
+                        completed_files[file_path] = None
+            except asyncio.CancelledError:
+                # 批次被取消时，已经移动的文件仍交给写入协程记录
+                if completed_files:
+                    result_queue.put_nowait((book_categories, book_paths, completed_files))
+                raise
+
+            await result_queue.put((book_categories, book_paths, completed_files))
 
-                # 更新任务进度
-                completed_count = progress_info['processed_files'] + len(completed_files_list)
+        except Exception as e:
+            self._log(f"✗ 批次处理失败: {e}")
+            raise
+
+    async def _write_batch_results(self,
+                                   session,
+                                   task,
+                                   result_queue: asyncio.Queue) -> None:
+        """单写入协程：依次把批次结果写入数据库并更新任务进度
+
+        整个任务复用调用方的数据库会话，不再逐批次打开和关闭会话
+
+        Args:
+            session: 数据库会话
+            task: 分类任务对象
+            result_queue: 批次结果队列，收到 None 时结束
+        """
+        # 进度计数只在开始时读取一次，之后在本地累加，避免每批次重新加载任务记录
+        task_id = task.task_id
+        total_files = task.total_files
+        processed_files = task.processed_files
+
+        # 尚未写入的图书分类，与累积的任务进度在同一事务中提交；
+        # 事务只在写入时短暂开启，不会在等待队列期间占用 SQLite 写锁
+        pending_categories = {}
+        pending_paths = {}
+
+        def _flush() -> None:
+            self.database_manager.update_book_categories(
+                session, pending_categories, pending_paths, commit=False
+            )
+            self.task_manager.flush(session, task_id)
+            pending_categories.clear()
+            pending_paths.clear()
+
+        while True:
+            item = await result_queue.get()
+            if item is None:
+                break
 
-                # Get existing completed files and add new ones
-                existing_completed = json.loads(task_obj.completed_files) if task_obj.completed_files else []
-                all_completed = existing_completed + completed_files_list
+            book_categories, book_paths, completed_files = item
+            try:
+                pending_categories.update(book_categories)
+                pending_paths.update(book_paths)
 
-                # Calculate remaining pending files
-                remaining_pending = [f for f in pending_files_list if f not in completed_files_list]
+                # 更新任务进度（累积若干批次后连同图书分类一起写入）
+                processed_files += len(completed_files)
 
-                self.task_manager.update_task_progress(
-                    current_session,
-                    task.task_id,
-                    completed_count,
-                    all_completed,
-                    remaining_pending
-                )
+                if self.task_manager.record_progress(
+                    task_id,
+                    processed_files,
+                    completed_files,
+                    is_completed=processed_files >= total_files
+                ):
+                    _flush()
 
-                print(f"✓ 批次处理完成")
+                self._log(f"✓ 批次处理完成")
+                self._log(f"   进度: {processed_files}/{total_files} "
+                          f"({processed_files / total_files * 100:.1f}%)")
 
             except Exception as e:
-                print(f"✗ 批次处理失败: {e}")
+                self._log(f"✗ 批次结果写入失败: {e}")
                 raise
-            finally:
-                current_session.close()
+
+        # 任务中途失败时仍有累积未写入的结果，结束前统一写入
+        if self.task_manager.has_pending_progress(task_id):
+            _flush()
+
+    def _log(self, message: str) -> None:
+        """输出进度信息
+
+        分类过程中只把消息放入队列，由后台协程批量写出；其余时候直接打印
+
+        Args:
+            message: 要输出的信息
+        """
+        if self._log_queue is None:
+            print(message)
+        else:
+            self._log_queue.put_nowait(message)
+
+    async def _write_console_output(self,
+                                    log_queue: asyncio.Queue,
+                                    flush_interval: float = 0.1) -> None:
+        """后台输出协程：按时间间隔批量写出队列中的进度信息
+
+        Args:
+            log_queue: 进度信息队列，收到 None 时写出剩余信息并结束
+            flush_interval: 两次写出之间的最短间隔（秒）
+        """
+        while True:
+            messages = [await log_queue.get()]
+            while not log_queue.empty():
+                messages.append(log_queue.get_nowait())
+
+            lines = [message for message in messages if message is not None]
+            if lines:
+                sys.stdout.write('\n'.join(lines) + '\n')
+                sys.stdout.flush()
+
+            if None in messages:
+                break
+            await asyncio.sleep(flush_interval)
 
     def _get_filename_from_path(self, file_path: str) -> str:
         """从文件路径中提取文件名
@@ -240,8 +387,26 @@ class BookSortController:
         Returns:
             文件名
         """
-        import os
-        return os.path.basename(file_path)
+        # 路径均由 os.scandir 生成，直接按分隔符切分即可，无需 basename 的完整处理
+        return file_path.rpartition(os.sep)[2]
+
+
+class ConsoleLogFormatter(logging.Formatter):
+    """控制台日志格式：普通信息原样输出，警告和错误带上级别前缀"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """格式化日志记录
+
+        Args:
+            record: 日志记录
+
+        Returns:
+            INFO 及以下级别为原始消息，WARNING 及以上为 '级别: 消息'
+        """
+        message = super().format(record)
+        if record.levelno >= logging.WARNING:
+            return f"{record.levelname}: {message}"
+        return message
 
 
 def create_components(config_manager: ConfigManager):
@@ -259,10 +424,12 @@ def create_components(config_manager: ConfigManager):
 
     # 创建其他组件
     file_scanner = FileScanner(config_manager.get_book_extensions())
+    llm_cache = LLMCache(database_manager, config_manager.get_llm_cache_ttl_days())
     ai_service = AICategorizationService(
         config_manager.get_deepseek_api_url(),
         config_manager.get_deepseek_api_key(),
-        config_manager.get_batch_max_size()
+        config_manager.get_batch_max_size(),
+        llm_cache
     )
     file_manager = FileManager(config_manager.get_uncat_folder())
     task_manager = TaskManager(database_manager)
@@ -282,6 +449,14 @@ def main():
         # 1. 创建配置管理器
         config_manager = ConfigManager()
 
+        # 服务模块通过 logging 输出，按配置的级别打印到标准输出
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(ConsoleLogFormatter())
+        logging.basicConfig(
+            level=getattr(logging, config_manager.get_log_level(), logging.INFO),
+            handlers=[handler]
+        )
+
         # 2. 解析命令行参数
         parser = argparse.ArgumentParser(
             description="使用 AI 对图书进行智能分类",
@@ -6,6 +6,12 @@ import os
 import yaml
 from typing import Dict, Any, Optional, List
 
+# 优先使用 libyaml 提供的 C 实现解析器
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
 
 class ConfigManager:
     """配置管理器，负责加载和管理应用程序配置"""
@@ -18,6 +24,7 @@ class ConfigManager:
         """
         self.config_path = config_path
         self._config: Dict[str, Any] = {}
+        self._flat_config: Dict[str, Any] = {}
         self.load_config()
 
     def load_config(self) -> None:
@@ -29,7 +36,7 @@ class ConfigManager:
         """
         try:
             with open(self.config_path, 'r', encoding='utf-8') as f:
-                self._config = yaml.safe_load(f)
+                self._config = yaml.load(f, Loader=YamlLoader)
             print(f"配置文件加载成功: {self.config_path}")
         except FileNotFoundError:
             print(f"错误: 找不到配置文件 {self.config_path}")
@@ -40,6 +47,29 @@ class ConfigManager:
             print(f"错误: 配置文件格式错误: {e}")
             self._config = self._get_default_config()
 
+        self._flat_config = self._flatten_config(self._config or {})
+
+    def _flatten_config(self, config: Dict[str, Any], prefix: str = '') -> Dict[str, Any]:
+        """将嵌套配置展开为点号分隔键的扁平字典
+
+        嵌套字典本身也会保留在其键名下，例如同时生成 'default_paths'
+        和 'default_paths.src_dir' 两个键
+
+        Args:
+            config: 配置字典
+            prefix: 当前层级的键名前缀
+
+        Returns:
+            扁平配置字典
+        """
+        flat_config = {}
+        for key, value in config.items():
+            full_key = f"{prefix}{key}"
+            flat_config[full_key] = value
+            if isinstance(value, dict):
+                flat_config.update(self._flatten_config(value, f"{full_key}."))
+        return flat_config
+
     def _get_default_config(self) -> Dict[str, Any]:
         """获取默认配置
 
@@ -50,6 +80,9 @@ class ConfigManager:
             'deepseek_api_url': "https://api.deepseek.com/v1/chat/completions",
             'deepseek_api_key': "sk-your-api-key-here",
             'batch_max_size': 50,
+            'ai_concurrency': 8,
+            'llm_cache_ttl_days': 30,
+            'log_level': 'INFO',
             'book_exts': ['.pdf', '.epub', '.mobi', '.djvu', '.txt'],
             'uncat': '其他',
             'default_paths': {
@@ -68,16 +101,7 @@ class ConfigManager:
         Returns:
             配置项值
         """
-        if '.' in key:
-            keys = key.split('.')
-            value = self._config
-            for k in keys:
-                if isinstance(value, dict) and k in value:
-                    value = value[k]
-                else:
-                    return default
-            return value
-        return self._config.get(key, default)
+        return self._flat_config.get(key, default)
 
     def get_deepseek_api_url(self) -> str:
         """获取 DeepSeek API URL
@@ -107,6 +131,37 @@ class ConfigManager:
         """
         return self.get('batch_max_size', 50)
 
+    def get_ai_concurrency(self) -> int:
+        """获取同时进行 AI 分类的最大批次数
+
+        Returns:
+            最大并发批次数
+
+        Raises:
+            ValueError: 配置值不是大于等于 1 的整数
+        """
+        concurrency = self.get('ai_concurrency', 8)
+        # 并发数为 0 时信号量永远无法获取，分类过程会无提示地挂起
+        if isinstance(concurrency, bool) or not isinstance(concurrency, int) or concurrency < 1:
+            raise ValueError(f"ai_concurrency 必须是大于等于 1 的整数，当前值: {concurrency!r}")
+        return concurrency
+
+    def get_llm_cache_ttl_days(self) -> int:
+        """获取 AI 分类结果缓存的有效天数
+
+        Returns:
+            缓存有效天数
+        """
+        return self.get('llm_cache_ttl_days', 30)
+
+    def get_log_level(self) -> str:
+        """获取服务模块的日志级别
+
+        Returns:
+            日志级别名称，如 'INFO'、'WARNING'
+        """
+        return str(self.get('log_level', 'INFO')).upper()
+
     def get_book_extensions(self) -> List[str]:
         """获取支持的图书文件扩展名
 
@@ -3,10 +3,39 @@
 负责数据库连接、初始化和数据操作
 """
 import json
-from typing import List, Optional
-from sqlalchemy import create_engine
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import bindparam, create_engine, event, func, insert, inspect, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import sessionmaker, Session
-from .models import Base, BookInfo, ClassificationTask
+from .models import (Base, BookInfo, ClassificationTask, TaskFile, LLMResponseCache,
+                     TitleClassification, LOCAL_NOW)
+
+# 每个新建 SQLite 连接执行的 PRAGMA：WAL 日志 + NORMAL 同步级别，
+# 避免每次 commit 都触发完整 fsync，并让读写互不阻塞
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+)
+
+
+def _configure_sqlite_connection(dbapi_connection, connection_record) -> None:
+    """新连接建立时应用 SQLite PRAGMA 设置
+
+    Args:
+        dbapi_connection: 底层 sqlite3 连接
+        connection_record: 连接池记录
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
 
 
 class DatabaseManager:
@@ -19,7 +48,11 @@ class DatabaseManager:
             db_path: 数据库文件路径
         """
         self.db_path = db_path
-        self.engine = create_engine(f'sqlite:///{db_path}')
+        self.engine = create_engine(
+            f'sqlite:///{db_path}',
+            connect_args={'check_same_thread': False}
+        )
+        event.listen(self.engine, 'connect', _configure_sqlite_connection)
         self.SessionLocal = sessionmaker(bind=self.engine)
 
     def get_session(self) -> Session:
@@ -38,15 +71,81 @@ class DatabaseManager:
         """
         try:
             Base.metadata.create_all(self.engine)
+            # create_all 不会为已存在的表补建索引，旧数据库需单独创建
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(self.engine, checkfirst=True)
+            self._migrate_legacy_task_files()
             print("数据库初始化完成")
         except Exception as e:
             print(f"数据库初始化失败: {e}")
             raise
 
+    def _migrate_legacy_task_files(self) -> None:
+        """把旧版本 JSON 列中的任务文件列表迁移到 task_files 表
+
+        旧版本在 classification_task 的 pending_files / completed_files 列中以 JSON 保存文件列表。
+        未完成且尚无 task_files 行的任务按 JSON 内容补建文件行；待处理列表为空或无法解析时
+        任务无法恢复，直接标记为完成。旧列保留不动，迁移可重复执行
+
+        Raises:
+            Exception: 迁移失败
+        """
+        columns = {column['name'] for column in inspect(self.engine).get_columns('classification_task')}
+        if 'pending_files' not in columns:
+            return
+
+        task_table = ClassificationTask.__table__
+        task_file_table = TaskFile.__table__
+        completed_column = "completed_files" if 'completed_files' in columns else "NULL"
+
+        with self.engine.begin() as connection:
+            legacy_tasks = connection.execute(text(
+                f"SELECT task_id, pending_files, {completed_column} AS completed_files "
+                "FROM classification_task "
+                "WHERE is_completed = 0 "
+                "AND NOT EXISTS (SELECT 1 FROM task_files WHERE task_files.task_id = classification_task.task_id)"
+            )).all()
+
+            for task_id, pending_json, completed_json in legacy_tasks:
+                try:
+                    pending = json.loads(pending_json) if pending_json else []
+                    completed = json.loads(completed_json) if completed_json else []
+                except ValueError:
+                    pending, completed = [], []
+
+                if not pending:
+                    connection.execute(
+                        update(task_table)
+                        .where(task_table.c.task_id == task_id)
+                        .values(is_completed=True)
+                    )
+                    print(f"旧版本任务没有可恢复的待处理文件，已标记为完成: {task_id}")
+                    continue
+
+                rows = [{'task_id': task_id, 'file_path': path, 'status': TaskFile.STATUS_DONE}
+                        for path in completed]
+                rows += [{'task_id': task_id, 'file_path': path, 'status': TaskFile.STATUS_PENDING}
+                         for path in pending]
+                connection.execute(insert(task_file_table).prefix_with('OR IGNORE'), rows)
+                pending_count = connection.execute(
+                    select(func.count()).select_from(task_file_table)
+                    .where(task_file_table.c.task_id == task_id,
+                           task_file_table.c.status == TaskFile.STATUS_PENDING)
+                ).scalar()
+                # 让计数器与迁移后的文件行保持一致
+                connection.execute(
+                    update(task_table)
+                    .where(task_table.c.task_id == task_id)
+                    .values(total_files=task_table.c.processed_files + pending_count)
+                )
+                print(f"已迁移旧版本任务的文件列表: {task_id}，待处理文件数: {pending_count}")
+
     def get_or_create_book_info(self,
                                session: Session,
                                filename: str,
-                               file_path: str) -> BookInfo:
+                               file_path: str,
+                               file_stat: Optional[os.stat_result] = None) -> BookInfo:
         """获取或创建图书记录
 
         如果记录已存在则返回现有记录，否则创建新记录
@@ -55,6 +154,7 @@ class DatabaseManager:
             session: 数据库会话
             filename: 文件名
             file_path: 文件完整路径
+            file_stat: 调用方已获取的文件 stat 结果，为 None 时重新 stat
 
         Returns:
             BookInfo 对象
@@ -62,12 +162,11 @@ class DatabaseManager:
         Raises:
             Exception: 数据库操作失败
         """
-        import os
-
         book = session.query(BookInfo).filter_by(filename=filename).first()
         if not book:
             try:
-                file_stat = os.stat(file_path)
+                if file_stat is None:
+                    file_stat = os.stat(file_path)
                 book = BookInfo(
                     filename=filename,
                     file_path=file_path,
@@ -82,16 +181,57 @@ class DatabaseManager:
                 raise
         return book
 
+    def bulk_create_book_info(self,
+                              session: Session,
+                              file_stats: Dict[str, os.stat_result]) -> int:
+        """批量创建图书记录
+
+        一次 INSERT OR IGNORE 写入所有记录，文件名已存在的记录保持不变
+
+        Args:
+            session: 数据库会话
+            file_stats: 文件 stat 结果字典，键为文件完整路径
+
+        Returns:
+            新插入的记录数
+
+        Raises:
+            Exception: 数据库操作失败
+        """
+        if not file_stats:
+            return 0
+
+        rows = []
+        for file_path, file_stat in file_stats.items():
+            filename = os.path.basename(file_path)
+            rows.append({
+                'filename': filename,
+                'file_path': file_path,
+                'file_size': file_stat.st_size,
+                'file_ext': os.path.splitext(filename)[1].lower()
+            })
+
+        try:
+            result = session.execute(insert(BookInfo.__table__).prefix_with('OR IGNORE'), rows)
+            session.commit()
+            return result.rowcount
+        except Exception as e:
+            session.rollback()
+            print(f"批量创建图书记录失败: {e}")
+            raise
+
     def update_book_category(self,
                            session: Session,
                            filename: str,
-                           category: str) -> bool:
+                           category: str,
+                           file_path: Optional[str] = None) -> bool:
         """更新图书分类
 
         Args:
             session: 数据库会话
             filename: 文件名
             category: 分类标签
+            file_path: 文件移动后的新路径，为 None 时不更新路径
 
         Returns:
             True 表示更新成功，False 表示未找到记录
@@ -99,13 +239,12 @@ class DatabaseManager:
         Raises:
             Exception: 数据库操作失败
         """
-        from datetime import datetime
-
         book = session.query(BookInfo).filter_by(filename=filename).first()
         if book:
             try:
                 book.category_tag = category
-                book.updated_at = datetime.now()
+                if file_path is not None:
+                    book.file_path = file_path
                 session.commit()
                 return True
             except Exception as e:
@@ -114,6 +253,53 @@ class DatabaseManager:
                 raise
         return False
 
+    def update_book_categories(self,
+                               session: Session,
+                               categories: Dict[str, str],
+                               file_paths: Dict[str, str],
+                               commit: bool = True) -> int:
+        """批量更新一批图书的分类和路径
+
+        绕过 ORM 工作单元，直接以 Core UPDATE + executemany 写入整个批次
+
+        Args:
+            session: 数据库会话
+            categories: 分类结果，键为文件名，值为分类标签
+            file_paths: 文件移动后的新路径，键为文件名
+            commit: 是否立即提交；为 False 时由调用方在同一事务中统一提交
+
+        Returns:
+            更新的记录数
+
+        Raises:
+            Exception: 数据库操作失败
+        """
+        if not categories:
+            return 0
+
+        book_table = BookInfo.__table__
+        statement = (
+            update(book_table)
+            .where(book_table.c.filename == bindparam('book_filename'))
+            .values(category_tag=bindparam('book_category'),
+                    file_path=bindparam('book_path'))
+        )
+
+        try:
+            result = session.execute(statement, [
+                {'book_filename': filename,
+                 'book_category': category,
+                 'book_path': file_paths[filename]}
+                for filename, category in categories.items()
+            ])
+            if commit:
+                session.commit()
+            return result.rowcount
+        except Exception as e:
+            session.rollback()
+            print(f"批量更新图书分类失败: {e}")
+            raise
+
     def get_book_by_filename(self,
                            session: Session,
                            filename: str) -> Optional[BookInfo]:
@@ -162,11 +348,14 @@ class DatabaseManager:
         try:
             task = ClassificationTask(
                 task_id=task_id,
-                total_files=len(files),
-                pending_files=json.dumps(files),
-                completed_files=json.dumps([])
+                total_files=len(files)
             )
             session.add(task)
+            session.execute(
+                insert(TaskFile),
+                [{'task_id': task_id, 'file_path': file_path, 'status': TaskFile.STATUS_PENDING}
+                 for file_path in files]
+            )
             session.commit()
             return task
         except Exception as e:
@@ -176,36 +365,92 @@ class DatabaseManager:
 
     def update_classification_task(self,
                                  session: Session,
-                                 task: ClassificationTask,
+                                 task_id: str,
                                  processed_files: int,
-                                 completed_files_list: List[str],
-                                 pending_files_list: List[str]) -> None:
+                                 completed_files: Dict[str, str],
+                                 is_completed: Optional[bool] = None) -> bool:
         """更新分类任务状态
 
+        仅以 executemany 更新本批次完成的文件行，任务记录用一条 UPDATE 按 task_id 更新，
+        无需先查询任务对象
+
         Args:
             session: 数据库会话
-            task: ClassificationTask 对象
+            task_id: 任务唯一标识
             processed_files: 已处理文件数
-            completed_files_list: 已完成文件路径列表
-            pending_files_list: 待处理文件路径列表
+            completed_files: 本批次完成的文件，键为文件路径，值为分类标签
+            is_completed: 调用方已知的任务完成状态，为 None 时按已处理数是否达到总数判断
+
+        Returns:
+            True 表示任务已更新，False 表示任务不存在
 
         Raises:
             Exception: 数据库操作失败
         """
-        from datetime import datetime
-
         try:
-            task.processed_files = processed_files
-            task.completed_files = json.dumps(completed_files_list)
-            task.pending_files = json.dumps(pending_files_list)
-            task.is_completed = len(pending_files_list) == 0
-            task.updated_at = datetime.now()
+            if completed_files:
+                task_file_table = TaskFile.__table__
+                session.execute(
+                    update(task_file_table)
+                    .where(task_file_table.c.task_id == task_id,
+                           task_file_table.c.file_path == bindparam('task_file_path'))
+                    .values(status=TaskFile.STATUS_DONE,
+                            category=bindparam('task_file_category')),
+                    [{'task_file_path': file_path, 'task_file_category': category}
+                     for file_path, category in completed_files.items()]
+                )
+
+            task_table = ClassificationTask.__table__
+            if is_completed is None:
+                # 每个完成的文件都计入 processed_files，达到总数即表示没有待处理文件
+                is_completed = task_table.c.total_files <= processed_files
+            result = session.execute(
+                update(task_table)
+                .where(task_table.c.task_id == task_id)
+                .values(processed_files=processed_files, is_completed=is_completed)
+            )
             session.commit()
+            return result.rowcount > 0
         except Exception as e:
             session.rollback()
             print(f"更新任务状态失败: {e}")
             raise
 
+    def get_pending_task_files(self,
+                             session: Session,
+                             task_id: str,
+                             limit: Optional[int] = None) -> List[str]:
+        """获取任务中待处理的文件路径
+
+        Args:
+            session: 数据库会话
+            task_id: 任务唯一标识
+            limit: 最多返回的文件数，None 表示全部
+
+        Returns:
+            待处理文件路径列表
+        """
+        query = session.query(TaskFile.file_path).filter_by(
+            task_id=task_id, status=TaskFile.STATUS_PENDING
+        )
+        if limit:
+            query = query.limit(limit)
+        return [row.file_path for row in query.all()]
+
+    def count_pending_task_files(self, session: Session, task_id: str) -> int:
+        """统计任务中待处理的文件数
+
+        Args:
+            session: 数据库会话
+            task_id: 任务唯一标识
+
+        Returns:
+            待处理文件数
+        """
+        return session.query(func.count(TaskFile.file_path)).filter_by(
+            task_id=task_id, status=TaskFile.STATUS_PENDING
+        ).scalar()
+
     def get_task_by_id(self,
                      session: Session,
                      task_id: str) -> Optional[ClassificationTask]:
@@ -241,3 +486,114 @@ class DatabaseManager:
             未完成的 ClassificationTask 对象列表
         """
         return session.query(ClassificationTask).filter_by(is_completed=False).all()
+
+    def get_cached_response(self,
+                          session: Session,
+                          cache_key: str,
+                          not_before: Optional[datetime] = None) -> Optional[str]:
+        """查询 AI 响应缓存
+
+        Args:
+            session: 数据库会话
+            cache_key: 缓存键
+            not_before: 早于该时间写入的缓存视为过期，None 表示不过期
+
+        Returns:
+            缓存的响应文本（JSON格式）或 None
+        """
+        query = session.query(LLMResponseCache.response).filter_by(cache_key=cache_key)
+        if not_before is not None:
+            query = query.filter(LLMResponseCache.created_at >= not_before)
+        row = query.first()
+        return row.response if row else None
+
+    def save_cached_response(self,
+                           session: Session,
+                           cache_key: str,
+                           response: str) -> None:
+        """写入 AI 响应缓存，键已存在时覆盖
+
+        Args:
+            session: 数据库会话
+            cache_key: 缓存键
+            response: 响应文本（JSON格式）
+
+        Raises:
+            Exception: 数据库操作失败
+        """
+        statement = sqlite_insert(LLMResponseCache.__table__).values(
+            cache_key=cache_key, response=response
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=['cache_key'],
+            set_={'response': statement.excluded.response, 'created_at': LOCAL_NOW}
+        )
+
+        try:
+            session.execute(statement)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"写入响应缓存失败: {e}")
+            raise
+
+    def get_title_classifications(self,
+                                session: Session,
+                                titles: List[str],
+                                categories_hash: str,
+                                not_before: Optional[datetime] = None) -> Dict[str, str]:
+        """批量查询单本图书的分类缓存
+
+        Args:
+            session: 数据库会话
+            titles: 图书标题列表
+            categories_hash: 分类体系摘要
+            not_before: 早于该时间写入的缓存视为过期，None 表示不过期
+
+        Returns:
+            命中的分类结果字典，键为书名，值为分类标签
+        """
+        if not titles:
+            return {}
+
+        query = session.query(TitleClassification.title, TitleClassification.category).filter(
+            TitleClassification.categories_hash == categories_hash,
+            TitleClassification.title.in_(titles)
+        )
+        if not_before is not None:
+            query = query.filter(TitleClassification.created_at >= not_before)
+        return {row.title: row.category for row in query.all()}
+
+    def save_title_classifications(self,
+                                 session: Session,
+                                 classifications: Dict[str, str],
+                                 categories_hash: str) -> None:
+        """批量写入单本图书的分类缓存，已存在时覆盖
+
+        Args:
+            session: 数据库会话
+            classifications: 分类结果字典，键为书名，值为分类标签
+            categories_hash: 分类体系摘要
+
+        Raises:
+            Exception: 数据库操作失败
+        """
+        if not classifications:
+            return
+
+        statement = sqlite_insert(TitleClassification.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=['title', 'categories_hash'],
+            set_={'category': statement.excluded.category, 'created_at': LOCAL_NOW}
+        )
+
+        try:
+            session.execute(statement, [
+                {'title': title, 'categories_hash': categories_hash, 'category': category}
+                for title, category in classifications.items()
+            ])
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"写入图书分类缓存失败: {e}")
+            raise
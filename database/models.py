@@ -2,13 +2,15 @@
 数据库模型定义模块
 定义 ORM 数据模型
 """
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index, Text, func
 from sqlalchemy.orm import declarative_base
 
 # 创建基类
 Base = declarative_base()
 
+# 由 SQLite 在语句执行时生成本地时间戳，无需在 Python 端构造 datetime 参数
+LOCAL_NOW = func.datetime('now', 'localtime')
+
 
 class BookInfo(Base):
     """图书元信息表
@@ -37,15 +39,15 @@ class BookInfo(Base):
                      comment='文件扩展名，如 .pdf, .epub 等')
 
     # 分类标签
-    category_tag = Column(String,
+    category_tag = Column(String, index=True,
                          comment='分类标签，如 "计算机", "文学" 等。未分类时为空')
 
     # 创建时间
-    created_at = Column(DateTime, default=datetime.now,
+    created_at = Column(DateTime, default=LOCAL_NOW,
                        comment='记录创建时间')
 
     # 更新时间
-    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now,
+    updated_at = Column(DateTime, default=LOCAL_NOW, onupdate=LOCAL_NOW,
                        comment='记录最后更新时间')
 
     def __repr__(self):
@@ -89,24 +91,16 @@ class ClassificationTask(Base):
     processed_files = Column(Integer, default=0,
                             comment='已经处理完成的文件数量')
 
-    # 已完成文件列表 (JSON格式)
-    completed_files = Column(Text,
-                            comment='已完成分类的文件路径列表，JSON格式存储')
-
-    # 待处理文件列表 (JSON格式)
-    pending_files = Column(Text,
-                          comment='待处理的文件路径列表，JSON格式存储')
-
     # 完成标记
-    is_completed = Column(Boolean, default=False, nullable=False,
+    is_completed = Column(Boolean, default=False, nullable=False, index=True,
                          comment='任务是否完成标记')
 
     # 创建时间
-    created_at = Column(DateTime, default=datetime.now,
+    created_at = Column(DateTime, default=LOCAL_NOW,
                        comment='任务创建时间')
 
     # 更新时间
-    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now,
+    updated_at = Column(DateTime, default=LOCAL_NOW, onupdate=LOCAL_NOW,
                        comment='任务状态最后更新时间')
 
     def __repr__(self):
@@ -122,8 +116,6 @@ class ClassificationTask(Base):
             'task_id': self.task_id,
             'total_files': self.total_files,
             'processed_files': self.processed_files,
-            'completed_files': self.completed_files,
-            'pending_files': self.pending_files,
             'is_completed': self.is_completed,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
@@ -139,6 +131,19 @@ class ClassificationTask(Base):
             return 0.0
         return (self.processed_files / self.total_files) * 100
 
+    def get_pending_count(self) -> int:
+        """获取待处理文件数
+
+        每处理一个文件，task_files 中恰好一行由 pending 变为 done，
+        并与 processed_files 在同一事务中提交，因此无需查询子表。
+        结果只由计数器推算：旧版本创建、没有 task_files 行的任务也会报告待处理文件，
+        判断任务能否恢复时应使用 DatabaseManager.count_pending_task_files
+
+        Returns:
+            待处理文件数
+        """
+        return max(0, self.total_files - (self.processed_files or 0))
+
     def is_active(self) -> bool:
         """检查任务是否进行中
 
@@ -146,3 +151,93 @@ class ClassificationTask(Base):
             True 表示任务进行中，False 表示已完成或尚未开始
         """
         return not self.is_completed and self.processed_files > 0
+
+
+class TaskFile(Base):
+    """分类任务文件表
+
+    逐文件记录任务中每个文件的处理状态，批次进度只需更新对应行
+    """
+    __tablename__ = 'task_files'
+
+    # 文件状态
+    STATUS_PENDING = 'pending'
+    STATUS_DONE = 'done'
+
+    # 所属任务标识
+    task_id = Column(String, ForeignKey('classification_task.task_id'), primary_key=True,
+                    comment='所属任务的唯一标识')
+
+    # 文件完整路径
+    file_path = Column(String, primary_key=True,
+                      comment='待分类文件的完整路径')
+
+    # 处理状态
+    status = Column(String, default=STATUS_PENDING, nullable=False,
+                   comment='文件处理状态: pending / done')
+
+    # 分类结果
+    category = Column(String,
+                     comment='文件处理完成后的分类标签')
+
+    __table_args__ = (
+        Index('ix_task_files_task_status', 'task_id', 'status'),
+    )
+
+    def __repr__(self):
+        """字符串表示"""
+        return (f"<TaskFile(task_id='{self.task_id}', file_path='{self.file_path}', "
+                f"status='{self.status}')>")
+
+
+class LLMResponseCache(Base):
+    """AI 分类响应缓存表
+
+    以请求内容的哈希为键缓存分类结果，相同请求无需再次调用 API
+    """
+    __tablename__ = 'llm_response_cache'
+
+    # 缓存键（请求内容的 SHA-256）
+    cache_key = Column(String, primary_key=True,
+                      comment='模型、书名列表、现有分类等请求内容的 SHA-256 十六进制摘要')
+
+    # 分类结果 (JSON格式)
+    response = Column(Text, nullable=False,
+                     comment='分类结果字典，JSON格式存储')
+
+    # 创建时间
+    created_at = Column(DateTime, default=LOCAL_NOW, onupdate=LOCAL_NOW, index=True,
+                       comment='缓存写入时间，用于判断是否过期')
+
+    def __repr__(self):
+        """字符串表示"""
+        return f"<LLMResponseCache(cache_key='{self.cache_key}', created_at={self.created_at})>"
+
+
+class TitleClassification(Base):
+    """单本图书分类缓存表
+
+    按书名和分类体系缓存单本图书的分类结果，批次中已知的书名无需再发送给 API
+    """
+    __tablename__ = 'title_classification'
+
+    # 书名
+    title = Column(String, primary_key=True,
+                  comment='图书文件名')
+
+    # 分类体系摘要
+    categories_hash = Column(String, primary_key=True,
+                            comment='排序后现有分类列表的 SHA-1 摘要，分类体系变化时缓存自动失效')
+
+    # 分类标签
+    category = Column(String, nullable=False,
+                     comment='AI 返回的分类标签')
+
+    # 创建时间
+    created_at = Column(DateTime, default=LOCAL_NOW, onupdate=LOCAL_NOW,
+                       comment='缓存写入时间，用于判断是否过期')
+
+    def __repr__(self):
+        """字符串表示"""
+        return (f"<TitleClassification(title='{self.title}', "
+                f"category='{self.category}')>")
@@ -3,21 +3,29 @@
 负责扫描文件系统，获取文件列表和分类信息
 """
 import os
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Union
 
 
 class FileScanner:
     """文件扫描器，负责文件系统扫描"""
 
-    def __init__(self, book_extensions: List[str] = None):
+    def __init__(self, book_extensions: List[str] = None, stat_workers: int = 32):
         """初始化文件扫描器
 
         Args:
             book_extensions: 支持的图书文件扩展名列表
+            stat_workers: 并发获取文件 stat 信息的线程数，默认为 32
         """
         self.book_extensions = book_extensions or [
             '.pdf', '.epub', '.mobi', '.djvu', '.txt'
         ]
+        # 预先计算小写扩展名集合（补全缺少的前导点），扫描时一次集合查找即可完成匹配
+        self._ext_set = frozenset(
+            ext.lower() if ext.startswith('.') else '.' + ext.lower()
+            for ext in self.book_extensions
+        )
+        self.stat_workers = stat_workers
 
     def scan_books(self, directory: str) -> List[str]:
         """扫描目录获取图书文件列表（仅根目录）
@@ -30,17 +38,60 @@ class FileScanner:
         """
         book_files = []
         try:
-            for filename in os.listdir(directory):
-                file_path = os.path.join(directory, filename)
-                if os.path.isfile(file_path):
-                    file_ext = os.path.splitext(filename)[1].lower()
-                    if file_ext in self.book_extensions:
-                        book_files.append(file_path)
+            # scandir 返回的 DirEntry 自带文件类型信息，无需逐个 stat
+            ext_set = self._ext_set
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name = entry.name
+                    dot = name.rfind('.')
+                    if dot >= 0 and name[dot:].lower() in ext_set and entry.is_file():
+                        book_files.append(entry.path)
         except Exception as e:
             print(f"扫描目录时发生未知错误: {e}")
 
         return book_files
 
+    def stat_books(self, file_paths: List[str]) -> Dict[str, os.stat_result]:
+        """获取图书文件的 stat 信息
+
+        stat 系统调用会释放 GIL，交给线程池并发执行，
+        在网络挂载或机械硬盘上可以重叠每个文件的访问延迟
+
+        Args:
+            file_paths: 图书文件完整路径列表
+
+        Returns:
+            stat 结果字典，键为文件路径；无法访问的文件会被跳过
+        """
+        file_stats = {}
+        if not file_paths:
+            return file_stats
+
+        workers = min(self.stat_workers, len(file_paths))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for file_path, result in executor.map(self._stat_file, file_paths):
+                if isinstance(result, OSError):
+                    print(f"获取文件信息失败 {file_path}: {result}")
+                else:
+                    file_stats[file_path] = result
+
+        return file_stats
+
+    @staticmethod
+    def _stat_file(file_path: str) -> Tuple[str, Union[os.stat_result, OSError]]:
+        """获取单个文件的 stat 信息（线程池任务）
+
+        Args:
+            file_path: 文件完整路径
+
+        Returns:
+            (文件路径, stat 结果或访问时的 OSError)
+        """
+        try:
+            return file_path, os.stat(file_path)
+        except OSError as e:
+            return file_path, e
+
     def get_existing_categories(self, directory: str, uncat_folder: str = '其他') -> List[str]:
         """获取所有现有的分类名称（即子目录）
 
@@ -53,9 +104,10 @@ class FileScanner:
         """
         categories = []
         try:
-            for item in os.listdir(directory):
-                if os.path.isdir(os.path.join(directory, item)) and item != uncat_folder:
-                    categories.append(item)
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name != uncat_folder and entry.is_dir():
+                        categories.append(entry.name)
         except Exception as e:
             print(f"获取现有分类时出错: {e}")
 
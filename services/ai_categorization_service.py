@@ -5,24 +5,148 @@ AI 分类服务模块
 import json
 import asyncio
 import aiohttp
-import re
-from typing import List, Dict, Optional
+import functools
+import logging
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Optional, Tuple
+from services.llm_cache import LLMCache
+
+logger = logging.getLogger(__name__)
+
+# orjson 为可选依赖，未安装时使用标准库 json（两者都可直接解析 bytes）
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        """序列化为 UTF-8 编码的 JSON 字节串（orjson.dumps 的标准库替代）"""
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+# 分类请求使用的模型与采样温度（同时参与缓存键计算）
+DEEPSEEK_MODEL = "deepseek-chat"
+TEMPERATURE = 0.3
+
+# 可重试的 HTTP 状态码，其余错误状态直接失败
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+# 指数退避参数（秒）；BACKOFF_CAP 同时是 Retry-After 等待时间的上限
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+# 解析失败时从文本中逐个尝试解码 JSON 对象，支持嵌套结构
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _is_classification(result) -> bool:
+    """检查解析结果是否为书名到分类标签的字典
+
+    Args:
+        result: 解析得到的 JSON 值
+
+    Returns:
+        True 表示为非空且键值均为字符串的字典
+    """
+    return (isinstance(result, dict) and bool(result)
+            and all(isinstance(key, str) and isinstance(value, str)
+                    for key, value in result.items()))
+
+
+@functools.lru_cache(maxsize=8)
+def _build_system_prompt(categories: Tuple[str, ...]) -> str:
+    """构建系统提示词
+
+    同一任务的各批次通常使用相同的分类列表，结果按分类元组缓存
+
+    Args:
+        categories: 排序后的现有分类元组
+
+    Returns:
+        系统提示词字符串
+    """
+    category_list = ", ".join(categories) if categories else "无"
+    return (
+        f"你是一个专业的图书分类系统。"
+        f"现有分类如下: [{category_list}]。"
+        f"请根据以下书名列表，为每本书从现有分类中选择一个最合适的分类标签。"
+        f"如果都不匹配，可以根据书名内容创建一个新的、简洁的分类标签。"
+        f"请以JSON格式返回结果,键是书名,值是分类标签。"
+        f"例如: {{'book1.pdf': '分类1', 'book2.epub': '分类2'}}"
+    )
 
 
 class AICategorizationService:
     """AI 分类服务，封装 DeepSeek API 调用"""
 
-    def __init__(self, api_url: str, api_key: str, batch_size: int = 50):
+    def __init__(self,
+                 api_url: str,
+                 api_key: str,
+                 batch_size: int = 50,
+                 cache: Optional[LLMCache] = None):
         """初始化 AI 分类服务
 
         Args:
             api_url: DeepSeek API URL
             api_key: DeepSeek API 密钥
             batch_size: 批处理大小，默认为 50
+            cache: 分类结果缓存，为 None 时不使用缓存
         """
         self.api_url = api_url
         self.api_key = api_key
         self.batch_size = batch_size
+        self.cache = cache
+        # 共享的 HTTP 会话，在首次请求时创建，复用连接池与 keep-alive 连接
+        self._session: Optional[aiohttp.ClientSession] = None
+        # 会话级超时；sock_read 限制两次读取之间的间隔，服务端迟迟不返回数据时同样中止
+        self._timeout = aiohttp.ClientTimeout(total=60, connect=10, sock_read=45)
+        # 请求头与请求体中不随批次变化的部分只构建一次
+        self._headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "User-Agent": "BookSort/1.0"
+        }
+        self._base_payload = {
+            "model": DEEPSEEK_MODEL,
+            "response_format": {"type": "json_object"},
+            "temperature": TEMPERATURE,
+            "stream": False
+        }
+
+    async def __aenter__(self) -> 'AICategorizationService':
+        """进入异步上下文"""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        """退出异步上下文时关闭共享会话"""
+        await self.aclose()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的 HTTP 会话（不存在或已关闭时重新创建）
+
+        Returns:
+            aiohttp ClientSession
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=32,
+                limit_per_host=16,
+                ttl_dns_cache=300,
+                keepalive_timeout=75
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout)
+        return self._session
+
+    async def aclose(self) -> None:
+        """关闭共享的 HTTP 会话"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
 
     async def classify_books(self,
                            titles: List[str],
@@ -39,8 +163,72 @@ class AICategorizationService:
         if not titles:
             return {}
 
-        async with aiohttp.ClientSession() as session:
-            return await self._classify_with_deepseek(session, titles, existing_categories)
+        if self.cache is None:
+            return await self._classify_with_deepseek(self._get_session(), titles, existing_categories)
+
+        # 现有分类列表可能在等待期间被其他批次追加，缓存键与请求使用同一份快照
+        categories = list(existing_categories)
+
+        cache_key = self.cache.make_key(DEEPSEEK_MODEL, titles, categories, TEMPERATURE)
+        cached = await self.cache.get_async(cache_key)
+        # 旧版本可能缓存过不完整的结果，只有覆盖全部书名时才直接使用，否则按单本缓存补齐
+        if cached and all(isinstance(cached.get(title), str) for title in titles):
+            return {title: cached[title] for title in titles}
+
+        # 已知分类的书名不再发送给 API，只请求未命中的部分
+        hits = await self.cache.get_titles_async(titles, categories)
+        misses = [title for title in titles if title not in hits]
+        if not misses:
+            return hits
+
+        api_result = await self._classify_with_deepseek(self._get_session(), misses, categories)
+
+        # 只缓存书名到分类标签的有效结果，缺失的书名下次仍会重新调用 API
+        classified = {title: api_result[title] for title in misses
+                      if isinstance(api_result.get(title), str)}
+        if classified:
+            await self.cache.set_titles_async(classified, categories)
+            # 整批缓存只保存覆盖全部书名的完整结果，避免部分结果长期遮蔽缺失的书名
+            if not hits and len(classified) == len(misses):
+                await self.cache.set_async(cache_key, classified)
+
+        return {**hits, **classified}
+
+    async def classify_all(self,
+                           titles: List[str],
+                           existing_categories: List[str],
+                           max_concurrency: int = 8) -> Dict[str, str]:
+        """按 batch_size 切分全部标题并发分类
+
+        各批次共享同一个 HTTP 会话和连接池，并发数由信号量限制；
+        单个批次失败不影响其他批次的结果
+
+        Args:
+            titles: 图书标题列表
+            existing_categories: 现有分类列表
+            max_concurrency: 最大并发批次数，默认为 8
+
+        Returns:
+            合并后的分类结果字典，键为文件名，值为分类标签
+        """
+        batches = [titles[i:i + self.batch_size]
+                   for i in range(0, len(titles), self.batch_size)]
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _classify_batch(batch: List[str]) -> Dict[str, str]:
+            async with semaphore:
+                return await self.classify_books(batch, existing_categories)
+
+        results = await asyncio.gather(*[_classify_batch(batch) for batch in batches],
+                                       return_exceptions=True)
+
+        merged = {}
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.error("批次分类失败: %s", result)
+                continue
+            merged.update(result)
+        return merged
 
     async def _classify_with_deepseek(self,
                                     session: aiohttp.ClientSession,
@@ -56,143 +244,182 @@ class AICategorizationService:
         Returns:
             分类结果字典
         """
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "Accept": "application/json",
-            "User-Agent": "BookSort/1.0"
-        }
-
-        category_list = ", ".join(existing_categories) if existing_categories else "无"
-        book_list_str = "\n".join([f"- {title}" for title in titles])
-
-        system_prompt = (
-            f"你是一个专业的图书分类系统。"
-            f"现有分类如下: [{category_list}]。"
-            f"请根据以下书名列表，为每本书从现有分类中选择一个最合适的分类标签。"
-            f"如果都不匹配，可以根据书名内容创建一个新的、简洁的分类标签。"
-            f"请以JSON格式返回结果,键是书名,值是分类标签。"
-            f"例如: {{'book1.pdf': '分类1', 'book2.epub': '分类2'}}"
-        )
-
+        system_prompt = _build_system_prompt(tuple(sorted(existing_categories)))
+        book_list_str = "\n".join(f"- {title}" for title in titles)
         user_prompt = f"请为以下书籍进行分类：\n{book_list_str}"
 
         payload = {
-            "model": "deepseek-chat",
+            **self._base_payload,
             "messages": [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
-            ],
-            "response_format": {"type": "json_object"},
-            "temperature": 0.3,
-            "stream": False
+            ]
         }
+        # 请求体只序列化一次，重试时直接复用
+        request_body = _json_dumps(payload)
 
         max_retries = 3
-        retry_delay = 2
 
         for attempt in range(max_retries):
+            retry_after = None
             try:
-                timeout = aiohttp.ClientTimeout(total=60, connect=10)
-
                 async with session.post(
                     self.api_url,
-                    headers=headers,
-                    json=payload,
-                    timeout=timeout
+                    headers=self._headers,
+                    data=request_body
                 ) as response:
                     if response.status == 200:
-                        response_text = await response.text()
-
-                        if not response_text:
-                            print(f"警告: API返回空响应 (尝试 {attempt + 1}/{max_retries})")
-                            if attempt < max_retries - 1:
-                                await asyncio.sleep(retry_delay)
-                                continue
-                            return {}
-
-                        return self._parse_response(response_text)
+                        # 直接解析响应字节，不先解码为完整的字符串
+                        body = await response.read()
+
+                        if body.strip():
+                            try:
+                                data = _json_loads(body)
+                            except ValueError as parse_error:
+                                # 响应外层无法解析（如传输被截断）时不从中提取对象，按可重试错误处理
+                                logger.warning("响应JSON解析失败: %s (尝试 %d/%d)",
+                                               parse_error, attempt + 1, max_retries)
+                            else:
+                                return self._parse_response(data)
+                        else:
+                            logger.warning("API返回空响应 (尝试 %d/%d)", attempt + 1, max_retries)
 
                     else:
                         error_text = await response.text()
-                        print(f"API请求失败: {response.status} - {error_text}")
+                        logger.warning("API请求失败: %s - %s", response.status, error_text)
+
+                        if response.status not in RETRYABLE_STATUSES:
+                            return {}
 
                         if response.status == 429:
-                            print("遇到速率限制，等待5秒后重试...")
-                            await asyncio.sleep(5)
-                            continue
+                            logger.warning("[rate_limited] 遇到速率限制 (尝试 %d/%d)", attempt + 1, max_retries)
 
-                        if attempt < max_retries - 1:
-                            await asyncio.sleep(retry_delay)
-                            continue
-                        return {}
+                        if response.status in (429, 503):
+                            retry_after = response.headers.get('Retry-After')
 
             except asyncio.TimeoutError:
-                print(f"请求超时 (尝试 {attempt + 1}/{max_retries})")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(retry_delay)
-                    continue
-                return {}
+                logger.warning("请求超时 (尝试 %d/%d)", attempt + 1, max_retries)
 
             except aiohttp.ClientPayloadError as e:
-                print(f"传输编码错误: {e} (尝试 {attempt + 1}/{max_retries})")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(retry_delay * (attempt + 1))
-                    continue
-                return {}
+                logger.warning("传输编码错误: %s (尝试 %d/%d)", e, attempt + 1, max_retries)
+
+            except aiohttp.ClientError as e:
+                logger.warning("网络错误: %s (尝试 %d/%d)", e, attempt + 1, max_retries)
 
             except Exception as e:
-                print(f"分类图书时出错: {e} (尝试 {attempt + 1}/{max_retries})")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(retry_delay)
-                    continue
+                logger.error("分类图书时出错: %s", e)
                 return {}
 
+            if attempt < max_retries - 1:
+                delay = self._backoff(attempt, retry_after)
+                logger.info("%.1f 秒后重试...", delay)
+                await asyncio.sleep(delay)
+
         return {}
 
-    def _parse_response(self, response_text: str) -> Dict[str, str]:
-        """解析 API 响应文本
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """计算重试等待时间
+
+        优先使用服务端 Retry-After 头给出的时间（最多等待 BACKOFF_CAP 秒，
+        避免一个批次长时间占用并发名额），否则使用带随机抖动的指数退避，
+        避免多个并发请求在同一时刻集中重试
 
         Args:
-            response_text: API 响应文本
+            attempt: 当前尝试序号（从 0 开始）
+            retry_after: 响应中的 Retry-After 头（秒数或 HTTP 日期）
 
         Returns:
-            分类结果字典
+            等待秒数
         """
+        if retry_after:
+            delay = self._parse_retry_after(retry_after)
+            if delay is not None:
+                return min(delay, BACKOFF_CAP)
+
+        return min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt) + random.uniform(0, BACKOFF_BASE)
+
+    def _parse_retry_after(self, retry_after: str) -> Optional[float]:
+        """解析 Retry-After 头
+
+        Args:
+            retry_after: Retry-After 头的值（秒数或 HTTP 日期）
+
+        Returns:
+            等待秒数，无法解析时返回 None
+        """
+        retry_after = retry_after.strip()
+        if retry_after.isdigit():
+            return float(retry_after)
+
         try:
-            data = json.loads(response_text)
+            retry_at = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+    def _parse_response(self, data: dict) -> Dict[str, str]:
+        """解析已解码的 API 响应
 
+        Args:
+            data: API 响应 JSON 对象
+
+        Returns:
+            分类结果字典
+        """
+        try:
             if 'choices' not in data or not data['choices']:
-                print(f"错误: API响应缺少choices字段: {data}")
+                logger.error("API响应缺少choices字段: %s", data)
                 return {}
 
             content = data['choices'][0]['message']['content']
 
-            if not content.strip():
-                print("错误: content字段为空")
+            if not isinstance(content, str) or not content.strip():
+                logger.error("content字段为空")
                 return {}
 
-            classification_result = json.loads(content)
+            classification_result = _json_loads(content)
+            if not _is_classification(classification_result):
+                logger.error("分类结果格式错误: %s", classification_result)
+                return {}
             return classification_result
 
-        except json.JSONDecodeError as parse_error:
-            print(f"JSON解析失败: {parse_error}")
-            print(f"尝试从响应中提取JSON模式...")
-
-            try:
-                json_match = re.search(r'\{[^{}]*\}', response_text)
-                if json_match:
-                    extracted_json = json.loads(json_match.group())
-                    print(f"成功从响应中提取JSON: {extracted_json}")
-                    return extracted_json
-            except:
-                print("提取的JSON仍然无效")
+        except ValueError as parse_error:
+            logger.warning("JSON解析失败: %s", parse_error)
+            return self._extract_json(content)
 
+        except (KeyError, IndexError, TypeError) as parse_error:
+            logger.error("响应结构错误: %s", parse_error)
             return {}
 
-        except (KeyError, IndexError) as parse_error:
-            print(f"响应结构错误: {parse_error}")
-            return {}
+    def _extract_json(self, text: str) -> Dict[str, str]:
+        """从无法直接解析的文本中提取 JSON 对象
+
+        Args:
+            text: 响应文本
+
+        Returns:
+            提取到的分类结果字典，提取失败时返回空字典
+        """
+        logger.info("尝试从响应中提取JSON模式...")
+
+        # 从每个 '{' 开始尝试解码，返回第一个书名到分类标签的 JSON 对象；
+        # 格式不符的对象整体跳过，不再进入其内部寻找嵌套对象
+        start = text.find('{')
+        while start != -1:
+            try:
+                extracted_json, end = _JSON_DECODER.raw_decode(text, start)
+            except ValueError:
+                start = text.find('{', start + 1)
+                continue
+            if _is_classification(extracted_json):
+                logger.info("成功从响应中提取JSON: %s", extracted_json)
+                return extracted_json
+            start = text.find('{', end)
+
+        logger.warning("提取的JSON仍然无效")
+        return {}
 
     def _build_prompt(self, titles: List[str], categories: List[str]) -> str:
         """构建 API 调用提示词（备用方法）
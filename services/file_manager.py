@@ -2,9 +2,31 @@
 文件管理器模块
 负责文件移动、目录创建和文件名处理
 """
+import asyncio
+import errno
+import logging
 import os
 import shutil
-from typing import List
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _listing_key(filename: str) -> str:
+    """计算文件名在目录列表缓存中的比较键
+
+    macOS 等文件系统默认大小写不敏感且会做 Unicode 规范化，
+    统一规范化并忽略大小写比较，避免缓存误判为无冲突而覆盖已有文件
+
+    Args:
+        filename: 文件名
+
+    Returns:
+        规范化后的比较键
+    """
+    return unicodedata.normalize('NFC', filename).casefold()
 
 
 class FileManager:
@@ -17,46 +39,110 @@ class FileManager:
             uncat_folder: 未分类文件夹名称，默认为 '其他'
         """
         self.uncat_folder = uncat_folder
+        # 源目录与目标根目录是否位于同一文件系统，键为目标根目录
+        self._same_fs_cache: Dict[str, bool] = {}
+        # 保护目录列表缓存：并发移动时文件名的选择与占用必须原子完成
+        self._listing_lock = threading.Lock()
+        # 本实例已确认存在（新建或原有）的分类目录，避免每次移动都调用 makedirs
+        self._created_dirs: Set[str] = set()
+        self._dirs_lock = threading.Lock()
 
     def move_file_to_category(self,
                              file_path: str,
                              target_dir: str,
-                             category: str) -> str:
+                             category: str,
+                             dir_listing_cache: Optional[Dict[str, Set[str]]] = None) -> Tuple[str, bool]:
         """将文件移动到指定分类目录
 
         Args:
             file_path: 源文件完整路径
             target_dir: 目标根目录
             category: 分类名称
+            dir_listing_cache: 分类目录的文件名列表缓存，键为分类目录路径；
+                传入时每个分类目录只读取一次，文件名冲突检测在内存中完成
 
         Returns:
-            目标文件完整路径
+            (目标文件完整路径, 是否新建了分类目录)
 
         Raises:
             Exception: 文件操作失败
         """
         filename = os.path.basename(file_path)
-        file_ext = os.path.splitext(filename)[1].lower()
 
         # 确定分类目录
-        category_dir = self.create_category_directory(target_dir, category)
+        category_dir, created_new_category = self.create_category_directory(target_dir, category)
 
-        # 构建目标文件路径
+        existing = None
         target_path = os.path.join(category_dir, filename)
 
-        # 处理文件名冲突
-        target_path = self.handle_duplicate_filename(target_path)
+        if dir_listing_cache is None:
+            # 处理文件名冲突
+            target_path = self.handle_duplicate_filename(target_path)
+        else:
+            with self._listing_lock:
+                existing = dir_listing_cache.get(category_dir)
+                if existing is None:
+                    existing = set() if created_new_category else {
+                        _listing_key(name) for name in os.listdir(category_dir)
+                    }
+                    dir_listing_cache[category_dir] = existing
+
+                # 处理文件名冲突，并在移动前占用选定的文件名
+                target_path = self.handle_duplicate_filename(target_path, existing)
+                target_key = _listing_key(os.path.basename(target_path))
+                existing.add(target_key)
 
         # 移动文件
         try:
-            shutil.move(file_path, target_path)
-            print(f"✓ 移动文件: {filename} -> {category}")
-            return target_path
+            self._move_file(file_path, target_path, target_dir)
+            logger.info("✓ 移动文件: %s -> %s", filename, category)
+            return target_path, created_new_category
         except Exception as e:
-            print(f"✗ 移动文件失败 {filename}: {e}")
+            if existing is not None:
+                with self._listing_lock:
+                    existing.discard(target_key)
+            logger.error("✗ 移动文件失败 %s: %s", filename, e)
             raise
 
-    def create_category_directory(self, target_dir: str, category: str) -> str:
+    async def move_file_to_category_async(self,
+                                         file_path: str,
+                                         target_dir: str,
+                                         category: str,
+                                         dir_listing_cache: Optional[Dict[str, Set[str]]] = None) -> Tuple[str, bool]:
+        """在线程池中执行 move_file_to_category，避免阻塞事件循环
+
+        参数与返回值同 move_file_to_category
+        """
+        return await asyncio.to_thread(
+            self.move_file_to_category, file_path, target_dir, category, dir_listing_cache
+        )
+
+    def _move_file(self, file_path: str, target_path: str, target_dir: str) -> None:
+        """移动单个文件，同一文件系统内直接重命名
+
+        os.rename 只更新目录项，不复制文件内容；跨文件系统时（EXDEV）
+        退回 shutil.move 复制后删除，并记住该目标根目录以后直接复制
+
+        Args:
+            file_path: 源文件完整路径
+            target_path: 目标文件完整路径（已处理文件名冲突）
+            target_dir: 目标根目录
+
+        Raises:
+            OSError: 文件操作失败
+        """
+        if self._same_fs_cache.get(target_dir, True):
+            try:
+                os.rename(file_path, target_path)
+                return
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                self._same_fs_cache[target_dir] = False
+
+        shutil.move(file_path, target_path)
+
+    def create_category_directory(self, target_dir: str, category: str) -> Tuple[str, bool]:
         """创建分类目录（如果不存在）
 
         Args:
@@ -64,37 +150,74 @@ class FileManager:
             category: 分类名称
 
         Returns:
-            分类目录的完整路径
+            (分类目录的完整路径, 是否为本次新建)
         """
         category_dir = os.path.join(target_dir, category)
-        os.makedirs(category_dir, exist_ok=True)
-        return category_dir
-
-    def handle_duplicate_filename(self, target_path: str) -> str:
+        if category_dir in self._created_dirs:
+            return category_dir, False
+
+        with self._dirs_lock:
+            # 加锁后再检查一次，并发移动时只有一个调用会报告新建
+            if category_dir in self._created_dirs:
+                return category_dir, False
+            try:
+                os.makedirs(category_dir)
+                created = True
+            except FileExistsError:
+                created = False
+            self._created_dirs.add(category_dir)
+
+        return category_dir, created
+
+    def handle_duplicate_filename(self,
+                                  target_path: str,
+                                  existing: Optional[Set[str]] = None) -> str:
         """处理目标路径文件名冲突
 
-        如果目标文件已存在，自动在文件名后添加计数器
+        如果目标文件已存在，自动在文件名后添加计数器。
+        传入目录文件名集合时完全在内存中判断；否则按 1, 2, 4, 8... 指数探测后
+        二分查找空闲的计数器，连续冲突 N 个时只需 O(log N) 次 stat
 
         Args:
             target_path: 目标文件路径
+            existing: 目标目录中已有文件名的比较键集合（见 _listing_key），为 None 时查询文件系统
 
         Returns:
             处理后的目标文件路径
         """
-        if not os.path.exists(target_path):
-            return target_path
-
         directory = os.path.dirname(target_path)
         filename = os.path.basename(target_path)
         base_name, ext = os.path.splitext(filename)
 
-        counter = 1
-        while os.path.exists(target_path):
-            new_name = f"{base_name}_{counter}{ext}"
-            target_path = os.path.join(directory, new_name)
-            counter += 1
+        if existing is not None:
+            if _listing_key(filename) not in existing:
+                return target_path
+            counter = 1
+            while _listing_key(f"{base_name}_{counter}{ext}") in existing:
+                counter += 1
+            return os.path.join(directory, f"{base_name}_{counter}{ext}")
+
+        if not os.path.exists(target_path):
+            return target_path
+
+        def candidate(counter: int) -> str:
+            return os.path.join(directory, f"{base_name}_{counter}{ext}")
 
-        return target_path
+        if not os.path.exists(candidate(1)):
+            return candidate(1)
+
+        # 指数探测找到第一个空闲上界，再在 (已占用, 空闲] 区间内二分
+        taken, free = 1, 2
+        while os.path.exists(candidate(free)):
+            taken, free = free, free * 2
+        while free - taken > 1:
+            middle = (taken + free) // 2
+            if os.path.exists(candidate(middle)):
+                taken = middle
+            else:
+                free = middle
+
+        return candidate(free)
 
     def check_directory_access(self, directory: str) -> None:
         """检查目录访问权限
@@ -109,16 +232,19 @@ class FileManager:
         try:
             os.listdir(directory)
         except PermissionError:
-            print(f"\n错误：无法访问目录 '{directory}'。")
-            print("这通常是由于缺少 '完全磁盘访问权限' 导致的。")
-            print("\n请按照以下步骤授予权限：")
-            print("1. 打开 '系统设置' > '隐私与安全性'。")
-            print("2. 向下滚动并选择 '完全磁盘访问权限'。")
-            print("3. 点击 '+' 按钮，将您的终端应用程序（例如 'Terminal' 或 'iTerm'）添加到列表中。")
-            print("\n授权后，请重新运行脚本。")
+            logger.error(
+                "\n错误：无法访问目录 '%s'。\n"
+                "这通常是由于缺少 '完全磁盘访问权限' 导致的。\n"
+                "\n请按照以下步骤授予权限：\n"
+                "1. 打开 '系统设置' > '隐私与安全性'。\n"
+                "2. 向下滚动并选择 '完全磁盘访问权限'。\n"
+                "3. 点击 '+' 按钮，将您的终端应用程序（例如 'Terminal' 或 'iTerm'）添加到列表中。\n"
+                "\n授权后，请重新运行脚本。",
+                directory
+            )
             raise
         except FileNotFoundError:
-            print(f"\n错误：目录 '{directory}' 不存在。请检查路径是否正确。")
+            logger.error("\n错误：目录 '%s' 不存在。请检查路径是否正确。", directory)
             raise
 
     def get_existing_categories(self, directory: str) -> List[str]:
@@ -132,15 +258,22 @@ class FileManager:
         """
         categories = []
         try:
-            for item in os.listdir(directory):
-                item_path = os.path.join(directory, item)
-                if os.path.isdir(item_path) and item != self.uncat_folder:
-                    categories.append(item)
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name != self.uncat_folder and entry.is_dir():
+                        categories.append(entry.name)
         except Exception as e:
-            print(f"获取现有分类时出错: {e}")
+            logger.error("获取现有分类时出错: %s", e)
 
         return categories
 
+    async def get_existing_categories_async(self, directory: str) -> List[str]:
+        """在线程池中执行 get_existing_categories，避免阻塞事件循环
+
+        参数与返回值同 get_existing_categories
+        """
+        return await asyncio.to_thread(self.get_existing_categories, directory)
+
     def scan_books(self, directory: str, extensions: List[str]) -> List[str]:
         """扫描目录获取图书文件列表
 
@@ -152,14 +285,26 @@ class FileManager:
             图书文件完整路径列表
         """
         book_files = []
+        ext_set = frozenset(
+            ext.lower() if ext.startswith('.') else '.' + ext.lower()
+            for ext in extensions
+        )
         try:
-            for filename in os.listdir(directory):
-                file_path = os.path.join(directory, filename)
-                if os.path.isfile(file_path):
-                    file_ext = os.path.splitext(filename)[1].lower()
-                    if file_ext in extensions:
-                        book_files.append(file_path)
+            # scandir 返回的 DirEntry 自带文件类型信息，无需逐个 stat
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name = entry.name
+                    dot = name.rfind('.')
+                    if dot >= 0 and name[dot:].lower() in ext_set and entry.is_file():
+                        book_files.append(entry.path)
         except Exception as e:
-            print(f"扫描目录时发生未知错误: {e}")
+            logger.error("扫描目录时发生未知错误: %s", e)
 
         return book_files
+
+    async def scan_books_async(self, directory: str, extensions: List[str]) -> List[str]:
+        """在线程池中执行 scan_books，避免阻塞事件循环
+
+        参数与返回值同 scan_books
+        """
+        return await asyncio.to_thread(self.scan_books, directory, extensions)
@@ -0,0 +1,206 @@
+"""
+AI 响应缓存模块
+缓存 AI 分类结果，相同的分类请求直接返回缓存结果
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from database.database_manager import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCache:
+    """AI 分类响应缓存，基于数据库持久化"""
+
+    def __init__(self, db_manager: DatabaseManager, ttl_days: int = 30):
+        """初始化响应缓存
+
+        Args:
+            db_manager: 数据库管理器实例
+            ttl_days: 缓存有效天数，默认为 30 天
+        """
+        self.db_manager = db_manager
+        self.ttl_days = ttl_days
+        # 单本图书分类的内存缓存，键为 (书名, 分类体系摘要)；
+        # 各 *_async 方法在线程池中读写数据库，数据库 I/O 不阻塞事件循环
+        self._title_cache: Dict[Tuple[str, str], str] = {}
+
+    def make_key(self,
+                 model: str,
+                 titles: List[str],
+                 existing_categories: List[str],
+                 temperature: float) -> str:
+        """计算分类请求的缓存键
+
+        书名和分类均排序后参与计算，顺序不同的相同请求共享缓存
+
+        Args:
+            model: 模型名称
+            titles: 图书标题列表
+            existing_categories: 现有分类列表
+            temperature: 采样温度
+
+        Returns:
+            SHA-256 十六进制摘要
+        """
+        request = json.dumps({
+            'model': model,
+            'titles': sorted(titles),
+            'cats': sorted(existing_categories),
+            'temp': temperature
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+    def get(self, cache_key: str) -> Optional[Dict[str, str]]:
+        """读取未过期的缓存结果
+
+        Args:
+            cache_key: 缓存键
+
+        Returns:
+            分类结果字典，未命中或已过期时返回 None
+        """
+        not_before = datetime.now() - timedelta(days=self.ttl_days)
+        session = self.db_manager.get_session()
+        try:
+            response = self.db_manager.get_cached_response(session, cache_key, not_before)
+            result = json.loads(response) if response else None
+        except Exception as e:
+            logger.error("读取响应缓存失败: %s", e)
+            return None
+        finally:
+            session.close()
+
+        # 损坏或格式不符的缓存行视为未命中，不影响分类流程
+        if result is not None and not isinstance(result, dict):
+            logger.error("响应缓存格式错误: %s", cache_key)
+            return None
+        return result
+
+    def set(self, cache_key: str, result: Dict[str, str]) -> None:
+        """写入缓存结果
+
+        写入失败只打印错误，不影响分类流程
+
+        Args:
+            cache_key: 缓存键
+            result: 分类结果字典
+        """
+        session = self.db_manager.get_session()
+        try:
+            self.db_manager.save_cached_response(
+                session, cache_key, json.dumps(result, ensure_ascii=False)
+            )
+        except Exception:
+            # save_cached_response 已输出错误信息
+            pass
+        finally:
+            session.close()
+
+    def make_categories_hash(self, existing_categories: List[str]) -> str:
+        """计算分类体系摘要
+
+        Args:
+            existing_categories: 现有分类列表
+
+        Returns:
+            排序后分类列表的 SHA-1 十六进制摘要
+        """
+        categories = json.dumps(sorted(existing_categories), ensure_ascii=False)
+        return hashlib.sha1(categories.encode('utf-8')).hexdigest()
+
+    def get_titles(self, titles: List[str], existing_categories: List[str]) -> Dict[str, str]:
+        """查询单本图书的缓存分类
+
+        先查内存缓存，未命中的书名再一次性查询数据库
+
+        Args:
+            titles: 图书标题列表
+            existing_categories: 现有分类列表
+
+        Returns:
+            命中的分类结果字典，键为书名，值为分类标签
+        """
+        categories_hash = self.make_categories_hash(existing_categories)
+
+        hits = {}
+        unknown = []
+        for title in titles:
+            category = self._title_cache.get((title, categories_hash))
+            if category is None:
+                unknown.append(title)
+            else:
+                hits[title] = category
+
+        if unknown:
+            not_before = datetime.now() - timedelta(days=self.ttl_days)
+            session = self.db_manager.get_session()
+            try:
+                stored = self.db_manager.get_title_classifications(
+                    session, unknown, categories_hash, not_before
+                )
+            except Exception as e:
+                logger.error("读取图书分类缓存失败: %s", e)
+                stored = {}
+            finally:
+                session.close()
+
+            for title, category in stored.items():
+                self._title_cache[(title, categories_hash)] = category
+            hits.update(stored)
+
+        return hits
+
+    def set_titles(self, classifications: Dict[str, str], existing_categories: List[str]) -> None:
+        """写入单本图书的分类结果
+
+        写入数据库失败只打印错误，内存缓存仍然生效
+
+        Args:
+            classifications: 分类结果字典，键为书名，值为分类标签
+            existing_categories: 现有分类列表
+        """
+        categories_hash = self.make_categories_hash(existing_categories)
+        for title, category in classifications.items():
+            self._title_cache[(title, categories_hash)] = category
+
+        session = self.db_manager.get_session()
+        try:
+            self.db_manager.save_title_classifications(session, classifications, categories_hash)
+        except Exception:
+            # save_title_classifications 已输出错误信息
+            pass
+        finally:
+            session.close()
+
+    async def get_async(self, cache_key: str) -> Optional[Dict[str, str]]:
+        """在线程池中执行 get，避免阻塞事件循环
+
+        参数与返回值同 get
+        """
+        return await asyncio.to_thread(self.get, cache_key)
+
+    async def set_async(self, cache_key: str, result: Dict[str, str]) -> None:
+        """在线程池中执行 set，避免阻塞事件循环
+
+        参数同 set
+        """
+        await asyncio.to_thread(self.set, cache_key, result)
+
+    async def get_titles_async(self, titles: List[str], existing_categories: List[str]) -> Dict[str, str]:
+        """在线程池中执行 get_titles，避免阻塞事件循环
+
+        参数与返回值同 get_titles
+        """
+        return await asyncio.to_thread(self.get_titles, titles, existing_categories)
+
+    async def set_titles_async(self, classifications: Dict[str, str], existing_categories: List[str]) -> None:
+        """在线程池中执行 set_titles，避免阻塞事件循环
+
+        参数同 set_titles
+        """
+        await asyncio.to_thread(self.set_titles, classifications, existing_categories)
@@ -2,8 +2,8 @@
 任务管理器模块
 负责创建和管理分类任务，追踪任务进度
 """
-import json
-from typing import List, Optional
+import time
+from typing import Dict, List, Optional, Tuple
 from sqlalchemy.orm import Session
 from database.models import ClassificationTask
 from database.database_manager import DatabaseManager
@@ -12,13 +12,23 @@ from database.database_manager import DatabaseManager
 class TaskManager:
     """任务管理器，负责任务的创建和状态管理"""
 
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self,
+                 db_manager: DatabaseManager,
+                 flush_interval: int = 10,
+                 flush_time_s: float = 2.0):
         """初始化任务管理器
 
         Args:
             db_manager: 数据库管理器实例
+            flush_interval: 累积多少次进度更新后写入数据库，默认为 10
+            flush_time_s: 距上次写入超过该秒数时立即写入，默认为 2.0
         """
         self.db_manager = db_manager
+        self.flush_interval = flush_interval
+        self.flush_time_s = flush_time_s
+        # 尚未写入数据库的进度，键为任务ID，值为 (已处理文件数, 累积的完成文件, 完成状态, 累积次数)
+        self._pending_updates: Dict[str, Tuple[int, Dict[str, str], Optional[bool], int]] = {}
+        self._last_flush = time.monotonic()
 
     def create_task(self, session: Session, task_id: str, files: List[str]) -> ClassificationTask:
         """创建分类任务
@@ -51,36 +61,104 @@ class TaskManager:
                            session: Session,
                            task_id: str,
                            processed_files: int,
-                           completed_files_list: List[str],
-                           pending_files_list: List[str]) -> Optional[ClassificationTask]:
+                           completed_files: Dict[str, str],
+                           is_completed: Optional[bool] = None) -> bool:
         """更新分类任务进度
 
+        进度先在内存中累积，达到 flush_interval 次、距上次写入超过 flush_time_s 秒
+        或任务完成时才写入数据库；数据库中始终保留最近一次写入的可恢复进度
+
         Args:
             session: 数据库会话
             task_id: 任务唯一标识
             processed_files: 已处理文件数
-            completed_files_list: 已完成文件路径列表
-            pending_files_list: 待处理文件路径列表
+            completed_files: 本批次完成的文件，键为文件路径，值为分类标签
+            is_completed: 调用方已知的任务完成状态，为 None 时按已处理数是否达到总数判断
 
         Returns:
-            更新后的 ClassificationTask 对象，如果任务不存在返回 None
+            True 表示已更新或已缓存，写入时任务不存在返回 False
 
         Raises:
             Exception: 数据库操作失败
         """
-        task = self.get_task(session, task_id)
-        if not task:
-            print(f"任务不存在: {task_id}")
-            return None
+        if self.record_progress(task_id, processed_files, completed_files, is_completed):
+            return self.flush(session, task_id)
+        return True
 
-        try:
-            self.db_manager.update_classification_task(
-                session, task, processed_files, completed_files_list, pending_files_list
-            )
-            return task
-        except Exception as e:
-            print(f"更新任务进度失败: {e}")
-            raise
+    def record_progress(self,
+                        task_id: str,
+                        processed_files: int,
+                        completed_files: Dict[str, str],
+                        is_completed: Optional[bool] = None) -> bool:
+        """在内存中累积任务进度，不访问数据库
+
+        需要与其他写入放在同一事务时，调用方先累积进度，
+        在返回 True 时执行自己的写入后再调用 flush 统一提交
+
+        Args:
+            task_id: 任务唯一标识
+            processed_files: 已处理文件数
+            completed_files: 本批次完成的文件，键为文件路径，值为分类标签
+            is_completed: 调用方已知的任务完成状态
+
+        Returns:
+            True 表示已达到写入条件，应调用 flush
+        """
+        _, buffered_files, _, ticks = self._pending_updates.get(task_id, (0, {}, None, 0))
+        buffered_files.update(completed_files)
+        ticks += 1
+        self._pending_updates[task_id] = (processed_files, buffered_files, is_completed, ticks)
+
+        return bool(is_completed
+                    or ticks >= self.flush_interval
+                    or time.monotonic() - self._last_flush >= self.flush_time_s)
+
+    def flush(self, session: Session, task_id: Optional[str] = None) -> bool:
+        """把累积的任务进度写入数据库
+
+        Args:
+            session: 数据库会话
+            task_id: 只写入该任务的进度，None 表示写入全部任务
+
+        Returns:
+            True 表示全部写入成功，有任务不存在时返回 False
+
+        Raises:
+            Exception: 数据库操作失败
+        """
+        task_ids = [task_id] if task_id is not None else list(self._pending_updates)
+        all_updated = True
+        for pending_task_id in task_ids:
+            pending = self._pending_updates.pop(pending_task_id, None)
+            if pending is None:
+                continue
+            processed_files, completed_files, is_completed, _ = pending
+
+            try:
+                updated = self.db_manager.update_classification_task(
+                    session, pending_task_id, processed_files, completed_files, is_completed
+                )
+            except Exception as e:
+                print(f"更新任务进度失败: {e}")
+                raise
+
+            if not updated:
+                print(f"任务不存在: {pending_task_id}")
+                all_updated = False
+
+        self._last_flush = time.monotonic()
+        return all_updated
+
+    def has_pending_progress(self, task_id: str) -> bool:
+        """检查任务是否有尚未写入数据库的进度
+
+        Args:
+            task_id: 任务唯一标识
+
+        Returns:
+            True 表示有待写入的进度
+        """
+        return task_id in self._pending_updates
 
     def get_task(self, session: Session, task_id: str) -> Optional[ClassificationTask]:
         """根据任务ID获取任务
@@ -94,6 +172,22 @@ class TaskManager:
         """
         return self.db_manager.get_task_by_id(session, task_id)
 
+    def get_pending_files(self,
+                          session: Session,
+                          task_id: str,
+                          limit: Optional[int] = None) -> List[str]:
+        """获取任务中待处理的文件
+
+        Args:
+            session: 数据库会话
+            task_id: 任务唯一标识
+            limit: 最多返回的文件数，None 表示全部
+
+        Returns:
+            待处理文件路径列表
+        """
+        return self.db_manager.get_pending_task_files(session, task_id, limit)
+
     def get_all_tasks(self, session: Session) -> List[ClassificationTask]:
         """获取所有任务
 
@@ -145,7 +239,7 @@ class TaskManager:
             'task_id': task.task_id,
             'total_files': task.total_files,
             'processed_files': task.processed_files,
-            'pending_files': len(json.loads(task.pending_files)) if task.pending_files else 0,
+            'pending_files': task.get_pending_count(),
             'percentage': task.get_progress_percentage(),
             'is_completed': task.is_completed,
             'created_at': task.created_at.isoformat() if task.created_at else None,
@@ -174,10 +268,11 @@ class TaskManager:
             print(f"任务已完成: {task_id}")
             return None
 
-        pending_files = json.loads(task.pending_files) if task.pending_files else []
-        if not pending_files:
+        # 以 task_files 中的实际行数为准：旧版本创建的任务没有文件行，不能按计数器判断为可恢复
+        pending_count = self.db_manager.count_pending_task_files(session, task_id)
+        if not pending_count:
             print(f"任务没有待处理的文件: {task_id}")
             return None
 
-        print(f"恢复任务: {task_id}, 待处理文件数: {len(pending_files)}")
+        print(f"恢复任务: {task_id}, 待处理文件数: {pending_count}")
         return task